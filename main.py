@@ -3,11 +3,15 @@
 整合所有模块，启动浏览器并开始监控 API 请求
 """
 import os
+import re
 import sys
+import json
 import argparse
 import signal
+import subprocess
 import threading
 from datetime import datetime
+from typing import Optional
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
@@ -17,6 +21,9 @@ from src.api_interceptor import APIInterceptor
 from src.error_summarizer import ErrorSummarizer
 from src.web_server import WebServer
 
+# ChromeDriver 路径缓存文件，记录解析时对应的 Chrome 版本
+DRIVER_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'check-pad-web', 'driver_path.json')
+
 
 class APIMonitor:
     """API 监控主类"""
@@ -61,6 +68,69 @@ class APIMonitor:
         self.cleanup()
         sys.exit(0)
     
+    @staticmethod
+    def _get_chrome_version() -> Optional[str]:
+        """
+        获取本地安装的 Chrome 浏览器版本
+        
+        Returns:
+            版本号字符串，无法检测时返回 None
+        """
+        if sys.platform == 'win32':
+            commands = [['reg', 'query', r'HKEY_CURRENT_USER\Software\Google\Chrome\BLBeacon', '/v', 'version']]
+        elif sys.platform == 'darwin':
+            commands = [['/Applications/Google Chrome.app/Contents/MacOS/Google Chrome', '--version']]
+        else:
+            commands = [[name, '--version'] for name in
+                        ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser')]
+        
+        for command in commands:
+            try:
+                result = subprocess.run(command, capture_output=True, text=True, timeout=5)
+            except (OSError, subprocess.SubprocessError):
+                continue
+            match = re.search(r'\d+\.\d+\.\d+\.\d+', result.stdout)
+            if match:
+                return match.group(0)
+        return None
+    
+    def _get_driver_path(self) -> str:
+        """
+        获取 ChromeDriver 路径
+        
+        Chrome 版本与缓存记录一致且驱动文件仍存在时直接使用缓存的路径，
+        否则通过 webdriver-manager 解析并更新缓存
+        
+        Returns:
+            ChromeDriver 可执行文件路径
+        """
+        chrome_version = self._get_chrome_version()
+        
+        if chrome_version:
+            try:
+                with open(DRIVER_CACHE_FILE, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+                # 缓存文件可能被改写为其他 JSON 值，格式不符时视为没有缓存
+                driver_path = cache.get('driver_path') if isinstance(cache, dict) else None
+                if (isinstance(driver_path, str) and cache.get('chrome_version') == chrome_version
+                        and os.path.isfile(driver_path) and os.access(driver_path, os.X_OK)):
+                    print(f"使用缓存的 ChromeDriver: {driver_path}")
+                    return driver_path
+            except (OSError, ValueError):
+                pass
+        
+        driver_path = ChromeDriverManager().install()
+        
+        if chrome_version:
+            try:
+                os.makedirs(os.path.dirname(DRIVER_CACHE_FILE), exist_ok=True)
+                with open(DRIVER_CACHE_FILE, 'w', encoding='utf-8') as f:
+                    json.dump({'chrome_version': chrome_version, 'driver_path': driver_path}, f)
+            except OSError as e:
+                print(f"警告: 无法写入 ChromeDriver 缓存: {e}")
+        
+        return driver_path
+    
     def _create_driver(self) -> webdriver.Chrome:
         """
         创建 Chrome WebDriver 实例
@@ -78,9 +148,6 @@ class APIMonitor:
             else:
                 print(f"警告: 用户数据目录不存在: {self.user_data_dir}")
         
-        # 启用性能日志
-        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
-        
         # 其他有用的选项
         options.add_argument('--enable-logging')
         options.add_argument('--v=1')
@@ -111,7 +178,7 @@ class APIMonitor:
         try:
             print("正在检查 ChromeDriver...")
             # 使用 webdriver-manager 自动管理 ChromeDriver
-            service = Service(ChromeDriverManager().install())
+            service = Service(self._get_driver_path())
             print("ChromeDriver 已就绪，正在启动浏览器...")
             
             # 设置超时时间（30秒）
@@ -198,17 +265,12 @@ class APIMonitor:
             
             # 等待用户操作
             try:
-                while True:
-                    # 处理日志
-                    self.interceptor.process_logs()
-                    # 检查浏览器是否还在运行
-                    try:
-                        _ = self.driver.current_url
-                    except Exception:
-                        print("浏览器已关闭")
-                        break
+                # 事件由拦截器的监控线程处理，主循环只负责检查浏览器是否还在运行
+                # （浏览器关闭时 CDP 连接随之断开）
+                while self.interceptor.alive:
                     import time
                     time.sleep(1)
+                print("浏览器已关闭")
             except KeyboardInterrupt:
                 print("\n接收到中断信号...")
             
@@ -2,19 +2,39 @@
 API 拦截模块
 使用 Chrome DevTools Protocol (CDP) 拦截和统计网络请求
 """
-import json
-import time
+import queue
+import hashlib
 import threading
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
+from .cdp_client import CDPClient
 from .error_summarizer import ErrorSummarizer
 from .response_validator import ResponseValidator, ErrorType
 
+try:
+    # pybase64 为可选依赖，使用 SIMD 指令加速 base64 解码
+    from pybase64 import b64decode
+except ImportError:
+    from base64 import b64decode
+
 
 class APIInterceptor:
     """API 拦截器"""
     
+    # 需要处理的 CDP 事件，其余网络事件在 CDP 客户端中直接丢弃
+    EVENT_METHODS = ('Network.requestWillBeSent', 'Network.responseReceived',
+                     'Network.loadingFinished', 'Network.loadingFailed')
+    # 错误记录中保留的请求体/响应体最大字符数
+    BODY_PREVIEW_SIZE = 4096
+    # 记录的已处理请求 ID 上限，超出后淘汰最早的记录
+    PROCESSED_IDS_LIMIT = 50000
+    # 待验证响应队列的容量，超出后丢弃最早的响应
+    RESPONSE_QUEUE_SIZE = 1000
+    # 等待响应的请求信息上限，超出后丢弃最早的记录（如页面关闭时未完成的请求）
+    PENDING_REQUESTS_LIMIT = 10000
+    
     def __init__(self, driver: webdriver.Chrome, headers: Dict[str, str], 
                  error_summarizer: ErrorSummarizer):
         """
@@ -29,13 +49,24 @@ class APIInterceptor:
         self.headers = headers
         self.error_summarizer = error_summarizer
         self.validator = ResponseValidator()
+        self.request_data: Dict[str, Dict] = {}  # 尚未收到响应的请求信息，key 为 requestId
         self.response_data: Dict[str, Dict] = {}  # 存储响应数据，key 为 requestId
-        self.processed_request_ids = set()  # 已处理的请求 ID
+        # 已处理的请求 ID，按处理顺序保留最近 PROCESSED_IDS_LIMIT 个
+        self.processed_request_ids: OrderedDict = OrderedDict()
+        self.cdp: Optional[CDPClient] = None  # 订阅网络事件的 CDP 连接
         self.monitoring = False
         self.monitor_thread = None
+        # 待验证的响应队列，由后台线程消费
+        self._response_queue: queue.Queue = queue.Queue(maxsize=self.RESPONSE_QUEUE_SIZE)
+        self._response_thread = None
     
     def start_intercepting(self):
         """开始拦截网络请求"""
+        # 启动验证响应的后台线程
+        if not self._response_thread:
+            self._response_thread = threading.Thread(target=self._drain_responses, daemon=True)
+            self._response_thread.start()
+        
         try:
             # 启用 Network 域
             self.driver.execute_cdp_cmd('Network.enable', {})
@@ -56,42 +87,184 @@ class APIInterceptor:
                 # 如果 CDP 命令不支持，忽略错误
                 pass
             
+            # 建立独立的 CDP WebSocket 连接，附加到所有标签页（包括之后打开的新标签页和弹出窗口）
+            # 并在每个页面上启用 Network 域、注入相同的 Headers
+            session_commands = [('Network.enable', {})]
+            if self.headers:
+                session_commands.append(('Network.setExtraHTTPHeaders', {'headers': self.headers}))
+            session_commands.append(('Network.setBypassServiceWorker', {'bypass': True}))
+            self.cdp = CDPClient.from_driver(self.driver, event_methods=self.EVENT_METHODS,
+                                             session_commands=session_commands)
+            if self.cdp and self.cdp.start():
+                self.cdp.auto_attach()
+                print("CDP 事件订阅已建立")
+            else:
+                self.cdp = None
+                print("警告: 无法建立 CDP WebSocket 连接，将无法拦截网络事件")
+            
         except Exception as e:
             print(f"启动拦截器时出错: {e}")
     
-    def process_logs(self):
-        """处理浏览器性能日志，提取网络请求信息"""
+    @property
+    def alive(self) -> bool:
+        """
+        浏览器是否仍在运行
+        
+        有 CDP 连接时直接使用连接状态，不需要额外的 WebDriver 请求；
+        没有 CDP 连接时才通过 WebDriver 探测
+        """
+        if self.cdp:
+            return self.cdp.connected
         try:
-            logs = self.driver.get_log('performance')
-            processed_count = 0
-            for log_entry in logs:
-                try:
-                    message = json.loads(log_entry['message'])
-                    message_method = message.get('message', {}).get('method', '')
-                    message_params = message.get('message', {}).get('params', {})
-                    
-                    if message_method == 'Network.responseReceived':
-                        self._handle_response_received(message_params)
-                        processed_count += 1
-                    elif message_method == 'Network.loadingFinished':
-                        self._handle_loading_finished(message_params)
-                        processed_count += 1
-                except (json.JSONDecodeError, KeyError) as e:
-                    continue
-        except Exception as e:
-            # 如果日志不可用，可能是性能日志未启用或浏览器版本不支持
-            # 首次错误时输出提示
-            if not hasattr(self, '_log_error_shown'):
-                print(f"警告: 无法获取性能日志: {e}")
-                self._log_error_shown = True
-            pass
-    
-    def _handle_response_received(self, params: Dict):
-        """处理响应接收事件"""
+            _ = self.driver.current_url
+            return True
+        except Exception:
+            return False
+    
+    def process_logs(self, timeout: float = 0):
+        """
+        处理已收到的 CDP 网络事件，提取网络请求信息
+        
+        Args:
+            timeout: 没有待处理事件时最多等待的时间（秒），0 表示不等待
+        """
+        if not self.cdp:
+            return
+        
+        try:
+            message = self.cdp.events.get(timeout=timeout) if timeout > 0 else self.cdp.events.get_nowait()
+        except queue.Empty:
+            return
+        
+        finished_params = []  # 本批次中加载完成的请求，统一获取响应体
+        while True:
+            message_method = message.get('method', '')
+            message_params = message.get('params', {})
+            
+            if message_method == 'Network.requestWillBeSent':
+                self._handle_request_will_be_sent(message_params)
+            elif message_method == 'Network.responseReceived':
+                self._handle_response_received(message_params, message.get('sessionId'))
+            elif message_method == 'Network.loadingFinished':
+                request_id = message_params.get('requestId', '')
+                if request_id and request_id not in self.processed_request_ids:
+                    if self._is_api_response(request_id):
+                        finished_params.append(message_params)
+                    else:
+                        # 非 API 请求无需获取响应体，直接标记为已处理
+                        self._mark_processed(request_id)
+                        self.response_data.pop(request_id, None)
+            elif message_method == 'Network.loadingFailed':
+                # 失败的请求不会再有 loadingFinished 事件，清理已记录的信息
+                request_id = message_params.get('requestId', '')
+                self.request_data.pop(request_id, None)
+                self.response_data.pop(request_id, None)
+            
+            try:
+                message = self.cdp.events.get_nowait()
+            except queue.Empty:
+                break
+        
+        if finished_params:
+            response_bodies = self._fetch_response_bodies(
+                [p['requestId'] for p in finished_params if p['requestId'] in self.response_data]
+            )
+            for message_params in finished_params:
+                self._handle_loading_finished(message_params, response_bodies.get(message_params['requestId']))
+    
+    def _mark_processed(self, request_id: str):
+        """
+        标记请求为已处理
+        
+        CDP 的 requestId 不会重复，被淘汰的旧 ID 最多导致一次多余的处理
+        
+        Args:
+            request_id: 请求 ID
+        """
+        self.processed_request_ids[request_id] = None
+        self.processed_request_ids.move_to_end(request_id)
+        if len(self.processed_request_ids) > self.PROCESSED_IDS_LIMIT:
+            self.processed_request_ids.popitem(last=False)
+    
+    def _is_api_response(self, request_id: str) -> bool:
+        """
+        根据已记录的 URL 和 MIME 类型判断响应是否可能为 API 请求
+        
+        Args:
+            request_id: 请求 ID
+        
+        Returns:
+            是否可能为 API 请求（没有响应信息时返回 True，交由后续流程处理）
+        """
+        response_info = self.response_data.get(request_id)
+        if not response_info:
+            return True
+        return self.validator.is_api_request(response_info['url'], response_info.get('mimeType', ''))
+    
+    def _fetch_response_bodies(self, request_ids: List[str]) -> Dict[str, Dict]:
+        """
+        批量获取响应体
+        
+        先通过 WebSocket 发出全部 Network.getResponseBody 请求，再按消息 id 统一收取响应，
+        整批只需等待约一次往返
+        
+        Args:
+            request_ids: 需要获取响应体的请求 ID 列表
+        
+        Returns:
+            requestId 到 getResponseBody 结果的字典，获取失败的请求不包含在内
+        """
+        response_bodies: Dict[str, Dict] = {}
+        pending_bodies: Dict[int, str] = {}  # CDP 消息 id -> requestId
+        
+        for request_id in request_ids:
+            try:
+                # 响应体需要向产生该请求的页面会话获取
+                message_id = self.cdp.send('Network.getResponseBody', {'requestId': request_id},
+                                           session_id=self.response_data[request_id].get('session_id'))
+                pending_bodies[message_id] = request_id
+            except Exception:
+                # WebSocket 已断开（通常是浏览器已关闭），无法再获取响应体
+                pass
+        
+        for message_id, request_id in pending_bodies.items():
+            try:
+                response_bodies[request_id] = self.cdp.wait_result(message_id)
+            except Exception:
+                # 某些响应可能无法获取（如跨域、已关闭的连接等）
+                pass
+        
+        return response_bodies
+    
+    def _handle_request_will_be_sent(self, params: Dict):
+        """
+        处理请求发送事件，记录请求方法、请求头和请求体
+        
+        Network.responseReceived 事件中不包含请求信息，需要在这里先记录下来
+        
+        Args:
+            params: Network.requestWillBeSent 事件参数
+        """
+        request_id = params.get('requestId', '')
+        if not request_id:
+            return
+        # 重定向时会以相同的 requestId 再次发送，保留最后一次的请求信息
+        self.request_data[request_id] = params.get('request', {})
+        if len(self.request_data) > self.PENDING_REQUESTS_LIMIT:
+            del self.request_data[next(iter(self.request_data))]
+    
+    def _handle_response_received(self, params: Dict, session_id: Optional[str] = None):
+        """
+        处理响应接收事件
+        
+        Args:
+            params: Network.responseReceived 事件参数
+            session_id: 产生该事件的页面会话 id
+        """
         try:
             response = params.get('response', {})
-            request = params.get('request', {})
             request_id = params.get('requestId', '')
+            request = self.request_data.pop(request_id, {})
             url = response.get('url', '')
             status = response.get('status', 0)
             
@@ -104,78 +277,141 @@ class APIInterceptor:
                     'mimeType': response.get('mimeType', ''),
                     'request_method': request.get('method', ''),
                     'request_headers': request.get('headers', {}),
-                    'request_post_data': request.get('postData', '')
+                    'request_post_data': request.get('postData', ''),
+                    'session_id': session_id
                 }
         except Exception as e:
             print(f"处理响应接收事件时出错: {e}")
     
-    def _handle_loading_finished(self, params: Dict):
-        """处理加载完成事件"""
+    def _handle_loading_finished(self, params: Dict, response_body: Optional[Dict] = None):
+        """
+        处理加载完成事件
+        
+        Args:
+            params: Network.loadingFinished 事件参数
+            response_body: Network.getResponseBody 的结果（获取失败时为 None）
+        """
         try:
             request_id = params.get('requestId', '')
             if not request_id or request_id in self.processed_request_ids:
                 return
             
-            if request_id in self.response_data:
-                response_info = self.response_data[request_id]
-                url = response_info['url']
-                status_code = response_info['status']
-                mime_type = response_info.get('mimeType', '')
-                request_method = response_info.get('request_method', '')
-                request_headers = response_info.get('request_headers', {})
-                request_body = response_info.get('request_post_data', '')
-                response_headers = response_info.get('headers', {})
-                
-                # 获取响应体
-                body_text = ""
+            # 取出并清理已记录的响应数据
+            response_info = self.response_data.pop(request_id, None)
+            if response_info is None:
+                return
+            
+            # 解码、验证和记录交给后台线程，避免大响应体阻塞事件处理
+            self._enqueue_response((response_info, response_body))
+            
+            # 标记为已处理
+            self._mark_processed(request_id)
+        except Exception as e:
+            print(f"处理加载完成事件时出错: {e}")
+    
+    def _enqueue_response(self, item: Tuple[Dict, Optional[Dict]]):
+        """
+        将待验证的响应放入队列，队列已满时丢弃最早的响应
+        
+        Args:
+            item: (响应信息, Network.getResponseBody 的结果)
+        """
+        while True:
+            try:
+                self._response_queue.put_nowait(item)
+                return
+            except queue.Full:
                 try:
-                    response_body = self.driver.execute_cdp_cmd('Network.getResponseBody', {
-                        'requestId': request_id
-                    })
-                    body_text = response_body.get('body', '')
-                    
-                    # 如果是 base64 编码，需要解码
-                    if response_body.get('base64Encoded', False):
-                        import base64
-                        body_text = base64.b64decode(body_text).decode('utf-8', errors='ignore')
-                except Exception as e:
-                    # 某些响应可能无法获取（如跨域、已关闭的连接等）
-                    body_text = ""
+                    self._response_queue.get_nowait()
+                    print("警告: 待验证的响应过多，已丢弃最早的响应")
+                except queue.Empty:
+                    pass
+    
+    def _drain_responses(self):
+        """后台线程：依次验证队列中的响应并记录错误，收到 None 时退出"""
+        while True:
+            item = self._response_queue.get()
+            if item is None:
+                break
+            self._process_response(*item)
+    
+    def _process_response(self, response_info: Dict, response_body: Optional[Dict]):
+        """
+        解码响应体、验证响应并记录错误
+        
+        Args:
+            response_info: _handle_response_received 记录的响应信息
+            response_body: Network.getResponseBody 的结果（获取失败时为 None）
+        """
+        try:
+            url = response_info['url']
+            status_code = response_info['status']
+            mime_type = response_info.get('mimeType', '')
+            request_method = response_info.get('request_method', '')
+            request_headers = response_info.get('request_headers', {})
+            request_body = response_info.get('request_post_data', '')
+            response_headers = response_info.get('headers', {})
+            
+            # 解析响应体
+            body_text = ""
+            if response_body:
+                body_text = response_body.get('body', '')
                 
-                # 验证响应（新的方法会判断是否为 API 请求）
-                is_success, error_type, error_message, is_api = self.validator.validate_response(
-                    status_code, body_text, url, mime_type
+                # 如果是 base64 编码，需要解码
+                if response_body.get('base64Encoded', False):
+                    try:
+                        body_text = b64decode(body_text).decode('utf-8', errors='ignore')
+                    except Exception:
+                        body_text = ""
+            
+            # 验证响应（新的方法会判断是否为 API 请求）
+            is_success, error_type, error_message, is_api = self.validator.validate_response(
+                status_code, body_text, url, mime_type
+            )
+            
+            # 如果不是 API 请求，跳过记录
+            if not is_api:
+                return
+            
+            # 如果是 API 请求但验证失败，记录错误（包含详细信息）
+            if not is_success:
+                # 只保留有限长度的请求体和响应体，完整内容以摘要标识
+                body_preview, body_hash = self._preview_body(body_text)
+                request_preview, request_hash = self._preview_body(request_body)
+                self.error_summarizer.add_error(
+                    url, error_type, error_message, status_code, body_preview,
+                    request_method, request_headers, request_preview, response_headers,
+                    request_body_hash=request_hash, response_body_hash=body_hash
                 )
-                
-                # 如果不是 API 请求，跳过记录
-                if not is_api:
-                    # 标记为已处理但不记录错误
-                    self.processed_request_ids.add(request_id)
-                    if request_id in self.response_data:
-                        del self.response_data[request_id]
-                    return
-                
-                # 如果是 API 请求但验证失败，记录错误（包含详细信息）
-                if not is_success:
-                    self.error_summarizer.add_error(
-                        url, error_type, error_message, status_code, body_text,
-                        request_method, request_headers, request_body, response_headers
-                    )
-                    print(f"发现错误: {url} - {error_type.value} - {error_message}")
-                
-                # 标记为已处理
-                self.processed_request_ids.add(request_id)
-                
-                # 清理已处理的响应数据
-                if request_id in self.response_data:
-                    del self.response_data[request_id]
+                print(f"发现错误: {url} - {error_type.value} - {error_message}")
         except Exception as e:
-            print(f"处理加载完成事件时出错: {e}")
+            print(f"验证响应时出错: {e}")
+    
+    @classmethod
+    def _preview_body(cls, body: str) -> Tuple[str, Optional[str]]:
+        """
+        截取请求体或响应体的预览，并计算完整内容的摘要
+        
+        Args:
+            body: 完整的请求体或响应体
+        
+        Returns:
+            (预览内容, 完整内容的 SHA-1 摘要)，内容为空时摘要为 None
+        """
+        if not body:
+            return body, None
+        body_hash = hashlib.sha1(body.encode('utf-8', errors='ignore')).hexdigest()
+        if len(body) > cls.BODY_PREVIEW_SIZE:
+            body = body[:cls.BODY_PREVIEW_SIZE] + f"\n...(已截断，共 {len(body)} 字符)"
+        return body, body_hash
     
     def start_monitoring(self):
         """开始持续监控请求"""
         if self.monitoring:
             return
+        if not self.cdp:
+            print("警告: CDP 连接不可用，无法开始监控")
+            return
         
         self.monitoring = True
         print("开始监控网络请求...")
@@ -184,8 +420,8 @@ class APIInterceptor:
         def monitor_loop():
             while self.monitoring:
                 try:
-                    self.process_logs()
-                    time.sleep(0.5)  # 每 0.5 秒检查一次
+                    # 有事件到达时立即处理，否则最多等待 0.5 秒后重新检查状态
+                    self.process_logs(timeout=0.5)
                 except Exception as e:
                     if self.monitoring:
                         print(f"监控过程中出错: {e}")
@@ -198,5 +434,16 @@ class APIInterceptor:
         self.monitoring = False
         if self.monitor_thread:
             self.monitor_thread.join(timeout=2)
+        # 处理完队列中剩余的响应后停止后台线程
+        if self._response_thread:
+            # 退出标记阻塞放入队列，不能像普通响应那样挤掉队列中尚未验证的响应
+            try:
+                self._response_queue.put(None, timeout=5)
+            except queue.Full:
+                print("警告: 待验证的响应未能在超时前处理完")
+            self._response_thread.join(timeout=5)
+            self._response_thread = None
+        if self.cdp:
+            self.cdp.close()
         print("监控已停止")
 
@@ -0,0 +1,257 @@
+"""
+CDP 客户端模块
+通过 WebSocket 直接连接 Chrome DevTools Protocol，订阅浏览器中所有页面的网络事件
+"""
+import json
+import queue
+import itertools
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+from urllib.request import urlopen
+import websocket
+from selenium import webdriver
+
+try:
+    # orjson 为可选依赖，解析 CDP 消息比标准库快数倍
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+
+class CDPClient:
+    """CDP WebSocket 客户端，连接浏览器端点并自动附加到所有页面"""
+    
+    # 自动附加后需要执行 session_commands 的目标类型（标签页、弹出窗口和跨域 iframe）
+    ATTACH_TARGET_TYPES = ('page', 'iframe')
+    
+    def __init__(self, ws_url: str, event_methods: Optional[Iterable[str]] = None,
+                 session_commands: Optional[Iterable[Tuple[str, Dict]]] = None):
+        """
+        初始化 CDP 客户端
+        
+        Args:
+            ws_url: 浏览器的 WebSocket 调试地址
+            event_methods: 需要放入事件队列的事件名，为 None 时保留全部事件
+            session_commands: 附加到每个页面后依次发送的 (方法名, 参数)，如 Network.enable
+        """
+        self.ws_url = ws_url
+        self.event_methods = frozenset(event_methods) if event_methods is not None else None
+        self.session_commands = tuple(session_commands or ())
+        self.events: queue.Queue = queue.Queue()  # 收到的 CDP 事件，已是解析后的字典
+        self._ws: Optional[websocket.WebSocketApp] = None
+        self._thread: Optional[threading.Thread] = None
+        self._connected = threading.Event()
+        self._message_ids = itertools.count(1)
+        self._results: Dict[int, Dict] = {}  # 命令响应，key 为消息 id
+        self._discarded: Set[int] = set()  # 不再等待响应的消息 id，响应到达时直接丢弃
+        self._results_cond = threading.Condition()
+    
+    @classmethod
+    def from_driver(cls, driver: webdriver.Chrome,
+                    event_methods: Optional[Iterable[str]] = None,
+                    session_commands: Optional[Iterable[Tuple[str, Dict]]] = None) -> Optional['CDPClient']:
+        """
+        根据 WebDriver 的调试地址创建 CDP 客户端，连接到浏览器端点
+        
+        Args:
+            driver: Selenium WebDriver 实例
+            event_methods: 需要放入事件队列的事件名，为 None 时保留全部事件
+            session_commands: 附加到每个页面后依次发送的 (方法名, 参数)
+        
+        Returns:
+            CDP 客户端实例，如果无法获取调试地址则返回 None
+        """
+        chrome_options = driver.capabilities.get('goog:chromeOptions', {})
+        debugger_address = chrome_options.get('debuggerAddress')
+        if not debugger_address:
+            return None
+        
+        with urlopen(f'http://{debugger_address}/json/version', timeout=5) as response:
+            version_info = _json.loads(response.read())
+        
+        ws_url = version_info.get('webSocketDebuggerUrl')
+        if not ws_url:
+            return None
+        return cls(ws_url, event_methods, session_commands)
+    
+    def start(self, timeout: float = 5) -> bool:
+        """
+        在后台线程中建立 WebSocket 连接
+        
+        Args:
+            timeout: 等待连接建立的超时时间（秒）
+        
+        Returns:
+            是否连接成功
+        """
+        self._ws = websocket.WebSocketApp(
+            self.ws_url,
+            on_open=self._on_open,
+            on_message=self._on_message,
+            on_close=self._on_close,
+            on_error=self._on_error
+        )
+        # 不发送 Origin 头，避免被 Chrome 的 --remote-allow-origins 检查拒绝
+        self._thread = threading.Thread(
+            target=self._ws.run_forever,
+            kwargs={'suppress_origin': True},
+            daemon=True
+        )
+        self._thread.start()
+        return self._connected.wait(timeout)
+    
+    @property
+    def connected(self) -> bool:
+        """连接是否仍然有效（浏览器关闭时连接会断开）"""
+        return self._connected.is_set()
+    
+    def auto_attach(self, timeout: float = 10):
+        """
+        自动附加到浏览器中已有和之后新建的所有目标（包括新标签页和弹出窗口）
+        
+        附加后的页面会话由读取线程发送 session_commands，然后恢复页面运行
+        
+        Args:
+            timeout: 等待命令响应的超时时间（秒）
+        """
+        self.execute('Target.setAutoAttach', {
+            'autoAttach': True,
+            'waitForDebuggerOnStart': True,
+            'flatten': True
+        }, timeout=timeout)
+    
+    def send(self, method: str, params: Optional[Dict] = None, discard_result: bool = False,
+             session_id: Optional[str] = None) -> int:
+        """
+        发送 CDP 命令，不等待响应
+        
+        Args:
+            method: CDP 方法名
+            params: 方法参数
+            discard_result: 是否丢弃命令响应（不会再调用 wait_result 时使用，避免响应堆积）
+            session_id: 目标会话 id，为 None 时发送给浏览器
+        
+        Returns:
+            消息 id，可用于 wait_result 获取响应
+        """
+        message_id = next(self._message_ids)
+        if discard_result:
+            with self._results_cond:
+                self._discarded.add(message_id)
+        message = {'id': message_id, 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+        self._ws.send(_json.dumps(message))
+        return message_id
+    
+    def wait_result(self, message_id: int, timeout: float = 10) -> Dict:
+        """
+        等待指定消息 id 的命令响应
+        
+        Args:
+            message_id: send 返回的消息 id
+            timeout: 超时时间（秒）
+        
+        Returns:
+            命令返回的 result 字典
+        """
+        with self._results_cond:
+            if not self._results_cond.wait_for(
+                    lambda: message_id in self._results or not self._connected.is_set(), timeout):
+                # 超时后不再等待，之后到达的响应直接丢弃
+                self._discarded.add(message_id)
+                raise TimeoutError(f"等待 CDP 响应超时: id={message_id}")
+            if message_id not in self._results:
+                raise ConnectionError("CDP 连接已关闭")
+            message = self._results.pop(message_id)
+        
+        if 'error' in message:
+            raise RuntimeError(message['error'].get('message', str(message['error'])))
+        return message.get('result', {})
+    
+    def execute(self, method: str, params: Optional[Dict] = None, timeout: float = 10) -> Dict:
+        """
+        发送 CDP 命令并等待响应
+        
+        Args:
+            method: CDP 方法名
+            params: 方法参数
+            timeout: 超时时间（秒）
+        
+        Returns:
+            命令返回的 result 字典
+        """
+        return self.wait_result(self.send(method, params), timeout)
+    
+    def close(self):
+        """关闭连接"""
+        if self._ws:
+            self._ws.close()
+        if self._thread:
+            self._thread.join(timeout=2)
+    
+    def _on_open(self, ws):
+        self._connected.set()
+    
+    def _on_message(self, ws, raw_message: str):
+        try:
+            message = _json.loads(raw_message)
+        except ValueError:
+            if _json is json:
+                return
+            # orjson 比标准库严格（如不接受单独的代理项转义 \ud800），解析失败时由标准库重新解析
+            try:
+                message = json.loads(raw_message)
+            except ValueError:
+                return
+        
+        if 'id' in message:
+            with self._results_cond:
+                message_id = message['id']
+                if message_id in self._discarded:
+                    self._discarded.discard(message_id)
+                else:
+                    self._results[message_id] = message
+                    self._results_cond.notify_all()
+        elif 'method' in message:
+            if message['method'] == 'Target.attachedToTarget':
+                self._on_attached(message.get('params', {}))
+            # 在读取线程中直接丢弃不关心的事件（如 Network.dataReceived），不进入事件队列
+            if self.event_methods is None or message['method'] in self.event_methods:
+                self.events.put(message)
+    
+    def _on_attached(self, params: Dict):
+        """
+        处理自动附加的新目标：为页面启用 session_commands 并继续自动附加其子目标，然后恢复运行
+        
+        在读取线程中直接发送命令，新页面在发出第一个请求前就已启用网络事件
+        
+        Args:
+            params: Target.attachedToTarget 事件参数
+        """
+        session_id = params.get('sessionId')
+        if not session_id:
+            return
+        try:
+            if params.get('targetInfo', {}).get('type') in self.ATTACH_TARGET_TYPES:
+                for method, command_params in self.session_commands:
+                    self.send(method, command_params, discard_result=True, session_id=session_id)
+                # 跨域 iframe 是页面的子目标，需要在页面会话上再开启自动附加
+                self.send('Target.setAutoAttach', {
+                    'autoAttach': True,
+                    'waitForDebuggerOnStart': True,
+                    'flatten': True
+                }, discard_result=True, session_id=session_id)
+        finally:
+            # 目标创建时处于暂停状态，无论是否需要监控都要恢复运行
+            self.send('Runtime.runIfWaitingForDebugger', discard_result=True, session_id=session_id)
+    
+    def _on_close(self, ws, close_status_code, close_msg):
+        self._connected.clear()
+        with self._results_cond:
+            # 连接关闭后不会再有响应到达
+            self._discarded.clear()
+            self._results_cond.notify_all()
+    
+    def _on_error(self, ws, error):
+        print(f"CDP 连接出错: {error}")
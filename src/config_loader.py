@@ -2,7 +2,6 @@
 配置加载模块
 用于读取和解析 config.properties 文件
 """
-import configparser
 import os
 from typing import Dict
 
@@ -33,28 +32,25 @@ class ConfigLoader:
         
         headers = {}
         
-        # 使用 configparser 读取 properties 文件
-        # 注意：configparser 默认使用 INI 格式，需要特殊处理 properties 格式
-        config = configparser.ConfigParser()
-        config.optionxform = str  # 保持键的大小写
-        
         try:
-            # 读取文件内容，手动处理 properties 格式
+            # 一次读取文件内容，手动处理 properties 格式
             with open(self.config_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    # 跳过空行和注释
-                    if not line or line.startswith('#'):
-                        continue
-                    
-                    # 解析键值对
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        key = key.strip()
-                        value = value.strip()
-                        # 跳过空值
-                        if key:
-                            headers[key] = value
+                text = f.read()
+            
+            for line in text.splitlines():
+                line = line.strip()
+                # 跳过空行和注释
+                if not line or line.startswith('#'):
+                    continue
+                
+                # 解析键值对
+                key, sep, value = line.partition('=')
+                if not sep:
+                    continue
+                key = key.strip()
+                # 跳过空键
+                if key:
+                    headers[key] = value.strip()
         except Exception as e:
             print(f"读取配置文件时出错: {e}")
             return {}
@@ -2,14 +2,22 @@
 错误汇总模块
 用于收集和汇总 API 错误信息，按 URI 去重
 """
-from typing import Dict, List, Optional
+import sys
+import types
+from typing import Dict, Iterator, List, Mapping, Optional
 from datetime import datetime
 from .response_validator import ErrorType
 
+# 所有空请求头/响应头共用的只读空映射
+_EMPTY_MAP: Mapping = types.MappingProxyType({})
+
 
 class ErrorDetail:
     """错误详情类，记录单次错误的详细信息"""
     
+    __slots__ = ('error_message', 'status_code', 'request_method', 'request_headers', 'request_body',
+                 'response_headers', 'response_body', 'timestamp', 'count')
+    
     def __init__(self, error_message: str, status_code: Optional[int] = None,
                  request_method: Optional[str] = None, request_headers: Optional[Dict] = None,
                  request_body: Optional[str] = None, response_headers: Optional[Dict] = None,
@@ -29,21 +37,28 @@ class ErrorDetail:
         """
         self.error_message = error_message
         self.status_code = status_code
-        self.request_method = request_method
-        self.request_headers = request_headers or {}
+        # 请求方法只有少数几种取值，驻留后所有详情共用同一个字符串对象
+        self.request_method = sys.intern(request_method) if request_method else request_method
+        # 请求头/响应头为空时共用同一个只读空映射，不为每个详情单独创建空字典
+        self.request_headers = request_headers if request_headers else _EMPTY_MAP
         self.request_body = request_body
-        self.response_headers = response_headers or {}
+        self.response_headers = response_headers if response_headers else _EMPTY_MAP
         self.response_body = response_body
         self.timestamp = timestamp or datetime.now()
+        self.count = 1  # 内容完全相同的错误出现次数
 
 
 class ErrorRecord:
     """错误记录类"""
     
+    __slots__ = ('uri', 'error_type', '_messages', '_joined_message', 'status_code', 'response_body',
+                 'count', 'details', '_detail_index')
+    
     def __init__(self, uri: str, error_type: ErrorType, error_message: str, 
                  status_code: Optional[int] = None, response_body: Optional[str] = None,
                  request_method: Optional[str] = None, request_headers: Optional[Dict] = None,
-                 request_body: Optional[str] = None, response_headers: Optional[Dict] = None):
+                 request_body: Optional[str] = None, response_headers: Optional[Dict] = None,
+                 request_body_hash: Optional[str] = None, response_body_hash: Optional[str] = None):
         """
         初始化错误记录
         
@@ -57,31 +72,32 @@ class ErrorRecord:
             request_headers: 请求头
             request_body: 请求体
             response_headers: 响应头
+            request_body_hash: 完整请求体的摘要（请求体被截断时用于区分不同内容）
+            response_body_hash: 完整响应体的摘要（响应体被截断时用于区分不同内容）
         """
         self.uri = uri
         self.error_type = error_type
-        self.error_message = error_message
+        # 出现过的不同错误消息（dict 保持插入顺序），只在出现新消息时重新拼接汇总消息
+        self._messages: Dict[str, None] = {error_message: None}
+        self._joined_message: str = error_message
         self.status_code = status_code
         self.response_body = response_body
         self.count = 1  # 同一 URI 的错误次数
-        # 存储每次错误的详细信息
+        # 存储不同错误的详细信息，内容相同的错误只保留一份
         self.details: List[ErrorDetail] = []
+        # 详情内容 (status_code, error_message, 请求体, 响应体) -> details 中的下标
+        self._detail_index: Dict[tuple, int] = {}
         
         # 添加第一次错误的详细信息
-        self.details.append(ErrorDetail(
-            error_message=error_message,
-            status_code=status_code,
-            request_method=request_method,
-            request_headers=request_headers,
-            request_body=request_body,
-            response_headers=response_headers,
-            response_body=response_body
-        ))
+        self._append_detail(error_message, status_code, request_method, request_headers,
+                            request_body, response_headers, response_body,
+                            request_body_hash, response_body_hash)
     
     def add_detail(self, error_message: str, status_code: Optional[int] = None,
                    request_method: Optional[str] = None, request_headers: Optional[Dict] = None,
                    request_body: Optional[str] = None, response_headers: Optional[Dict] = None,
-                   response_body: Optional[str] = None):
+                   response_body: Optional[str] = None, request_body_hash: Optional[str] = None,
+                   response_body_hash: Optional[str] = None):
         """
         添加错误详情
         
@@ -93,8 +109,45 @@ class ErrorRecord:
             request_body: 请求体
             response_headers: 响应头
             response_body: 响应体
+            request_body_hash: 完整请求体的摘要
+            response_body_hash: 完整响应体的摘要
         """
         self.count += 1
+        self._append_detail(error_message, status_code, request_method, request_headers,
+                            request_body, response_headers, response_body,
+                            request_body_hash, response_body_hash)
+        self._add_message(error_message)
+    
+    @property
+    def error_message(self) -> str:
+        """汇总错误消息，不同的错误消息以 " | " 连接"""
+        return self._joined_message
+    
+    def _add_message(self, error_message: str):
+        """
+        记录错误消息，出现新的消息时重新拼接汇总消息
+        
+        拼接由写入线程完成，Web 服务线程只读取拼接好的字符串，不会读到过期的结果
+        """
+        if error_message not in self._messages:
+            self._messages[error_message] = None
+            self._joined_message = " | ".join(self._messages)
+    
+    def _append_detail(self, error_message: str, status_code: Optional[int],
+                       request_method: Optional[str], request_headers: Optional[Dict],
+                       request_body: Optional[str], response_headers: Optional[Dict],
+                       response_body: Optional[str], request_body_hash: Optional[str] = None,
+                       response_body_hash: Optional[str] = None):
+        """记录一次错误详情，与已有详情内容相同时只累加该详情的次数"""
+        # 有摘要时用摘要区分内容，避免截断后不同的完整内容被误判为相同
+        detail_key = (status_code, error_message,
+                      request_body_hash or request_body, response_body_hash or response_body)
+        index = self._detail_index.get(detail_key)
+        if index is not None:
+            self.details[index].count += 1
+            return
+        
+        self._detail_index[detail_key] = len(self.details)
         self.details.append(ErrorDetail(
             error_message=error_message,
             status_code=status_code,
@@ -104,9 +157,6 @@ class ErrorRecord:
             response_headers=response_headers,
             response_body=response_body
         ))
-        # 如果错误消息不同，更新汇总消息
-        if error_message != self.error_message:
-            self.error_message += f" | {error_message}"
     
     def merge(self, other: 'ErrorRecord'):
         """
@@ -117,13 +167,16 @@ class ErrorRecord:
         """
         self.count += 1
         # 如果错误消息不同，合并显示
-        if self.error_message != other.error_message:
-            self.error_message += f" | {other.error_message}"
+        for error_message in other._messages:
+            self._add_message(error_message)
 
 
 class ErrorSummarizer:
     """错误汇总器"""
     
+    # URI 路径缓存的最大条目数，超过后清空重建
+    PATH_CACHE_SIZE = 4096
+    
     def __init__(self, output_file: str = None):
         """
         初始化错误汇总器
@@ -134,11 +187,14 @@ class ErrorSummarizer:
         self.errors: Dict[str, ErrorRecord] = {}  # 使用 URI 作为键进行去重
         self.output_file = output_file
         self.start_time = datetime.now()
+        self._path_cache: Dict[str, str] = {}  # URL -> URI 路径的缓存
+        self.version = 0  # 错误数据版本号，每次记录或清空时递增，供外部判断缓存是否失效
     
     def add_error(self, uri: str, error_type: ErrorType, error_message: str,
                   status_code: Optional[int] = None, response_body: Optional[str] = None,
                   request_method: Optional[str] = None, request_headers: Optional[Dict] = None,
-                  request_body: Optional[str] = None, response_headers: Optional[Dict] = None):
+                  request_body: Optional[str] = None, response_headers: Optional[Dict] = None,
+                  request_body_hash: Optional[str] = None, response_body_hash: Optional[str] = None):
         """
         添加错误记录
         
@@ -152,6 +208,8 @@ class ErrorSummarizer:
             request_headers: 请求头
             request_body: 请求体
             response_headers: 响应头
+            request_body_hash: 完整请求体的摘要（可选）
+            response_body_hash: 完整响应体的摘要（可选）
         """
         # 提取 URI 路径部分（去除查询参数和域名）
         clean_uri = self._extract_uri_path(uri)
@@ -166,14 +224,18 @@ class ErrorSummarizer:
                 request_headers=request_headers,
                 request_body=request_body,
                 response_headers=response_headers,
-                response_body=response_body
+                response_body=response_body,
+                request_body_hash=request_body_hash,
+                response_body_hash=response_body_hash
             )
         else:
             # 创建新记录
             self.errors[clean_uri] = ErrorRecord(
                 clean_uri, error_type, error_message, status_code, response_body,
-                request_method, request_headers, request_body, response_headers
+                request_method, request_headers, request_body, response_headers,
+                request_body_hash, response_body_hash
             )
+        self.version += 1
     
     def _extract_uri_path(self, url: str) -> str:
         """
@@ -186,12 +248,39 @@ class ErrorSummarizer:
             URI 路径
         """
         try:
-            from urllib.parse import urlparse
-            parsed = urlparse(url)
-            return parsed.path
-        except Exception:
-            # 如果解析失败，返回原始 URL
-            return url
+            return self._path_cache[url]
+        except KeyError:
+            pass
+        
+        path = None
+        # 常见情况（http(s)://host/path?query#fragment）直接切片，避免 urlparse 的开销
+        if url.startswith(('http://', 'https://')):
+            netloc_start = url.find('://') + 3
+            path_end = len(url)
+            query_start = url.find('?', netloc_start)
+            if query_start != -1:
+                path_end = query_start
+            fragment_start = url.find('#', netloc_start, path_end)
+            if fragment_start != -1:
+                path_end = fragment_start
+            path_start = url.find('/', netloc_start, path_end)
+            path = url[path_start:path_end] if path_start != -1 else ''
+            # 带 ;params 的路径交给 urlparse 处理
+            if ';' in path:
+                path = None
+        
+        if path is None:
+            try:
+                from urllib.parse import urlparse
+                path = urlparse(url).path
+            except Exception:
+                # 如果解析失败，返回原始 URL
+                return url
+        
+        if len(self._path_cache) >= self.PATH_CACHE_SIZE:
+            self._path_cache.clear()
+        self._path_cache[url] = path
+        return path
     
     def get_summary(self) -> List[ErrorRecord]:
         """
@@ -202,41 +291,43 @@ class ErrorSummarizer:
         """
         return list(self.errors.values())
     
-    def _generate_report_content(self) -> str:
+    def _iter_report_lines(self) -> Iterator[str]:
         """
-        生成报告内容
+        逐段生成报告内容，先生成报告头，再逐条生成错误记录
         
         Returns:
-            报告内容字符串
+            报告内容片段的迭代器
         """
         current_time = datetime.now()
         runtime = current_time - self.start_time
         
+        yield (
+            "API 错误汇总报告\n"
+            f"启动时间: {self.start_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"当前时间: {current_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"运行时长: {self._format_runtime(runtime)}\n\n"
+        )
+        
         if not self.errors:
-            report_content = "API 错误汇总报告\n"
-            report_content += f"启动时间: {self.start_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            report_content += f"当前时间: {current_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            report_content += f"运行时长: {self._format_runtime(runtime)}\n\n"
-            report_content += "未发现任何错误。\n"
-        else:
-            report_content = "API 错误汇总报告\n"
-            report_content += f"启动时间: {self.start_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            report_content += f"当前时间: {current_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            report_content += f"运行时长: {self._format_runtime(runtime)}\n\n"
-            report_content += f"共发现 {len(self.errors)} 个不同的 API 错误：\n\n"
-            
-            for uri, record in sorted(self.errors.items()):
-                report_content += "=" * 50 + "\n"
-                report_content += f"URI: {record.uri}\n"
-                report_content += f"错误类型: {record.error_type.value}\n"
-                report_content += f"错误内容: {record.error_message}\n"
-                if record.status_code:
-                    report_content += f"状态码: {record.status_code}\n"
-                if record.count > 1:
-                    report_content += f"错误次数: {record.count}\n"
-                report_content += "=" * 50 + "\n\n"
+            yield "未发现任何错误。\n"
+            return
+        
+        yield f"共发现 {len(self.errors)} 个不同的 API 错误：\n\n"
         
-        return report_content
+        separator = "=" * 50 + "\n"
+        for uri, record in sorted(self.errors.items()):
+            parts = [
+                f"{separator}"
+                f"URI: {record.uri}\n"
+                f"错误类型: {record.error_type.value}\n"
+                f"错误内容: {record.error_message}\n"
+            ]
+            if record.status_code:
+                parts.append(f"状态码: {record.status_code}\n")
+            if record.count > 1:
+                parts.append(f"错误次数: {record.count}\n")
+            parts.append(separator + "\n")
+            yield ''.join(parts)
     
     def _format_runtime(self, runtime) -> str:
         """
@@ -270,9 +361,9 @@ class ErrorSummarizer:
         target_file = output_file or self.output_file or "api_error_summary.txt"
         
         try:
-            report_content = self._generate_report_content()
+            # 逐条写入文件，避免先在内存中拼出完整报告
             with open(target_file, 'w', encoding='utf-8') as f:
-                f.write(report_content)
+                f.writelines(self._iter_report_lines())
             print(f"错误汇总报告已生成: {target_file}")
         except Exception as e:
             print(f"生成报告文件时出错: {e}")
@@ -280,4 +371,5 @@ class ErrorSummarizer:
     def clear(self):
         """清空所有错误记录"""
         self.errors.clear()
+        self.version += 1
 
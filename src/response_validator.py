@@ -3,10 +3,30 @@
 用于验证 API 响应的状态码和返回值
 """
 import json
-import re
+import functools
 from typing import Dict, Optional, Tuple
 from enum import Enum
 
+try:
+    # orjson 为可选依赖，解析响应体比标准库快数倍；解析失败时仍由标准库重新解析并给出错误信息
+    from orjson import loads as _fast_json_loads
+except ImportError:
+    from json import loads as _fast_json_loads
+
+
+def _json_loads(text: str):
+    """
+    解析 JSON 文本
+    
+    orjson 的错误信息与标准库不同，解析失败时由标准库重新解析，抛出的总是标准库的 JSONDecodeError
+    """
+    try:
+        return _fast_json_loads(text)
+    except ValueError:
+        if _fast_json_loads is json.loads:
+            raise
+        return json.loads(text)
+
 
 class ErrorType(Enum):
     """错误类型枚举"""
@@ -18,25 +38,36 @@ class ErrorType(Enum):
 class ResponseValidator:
     """响应验证器"""
     
-    # 静态资源文件扩展名
-    STATIC_FILE_EXTENSIONS = {'.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.ico', '.svg', 
-                              '.woff', '.woff2', '.ttf', '.eot', '.pdf', '.zip', '.mp4', '.mp3',
-                              '.webp', '.avif', '.jpg', '.jpeg'}
+    # 静态资源文件扩展名（不含点，小写）
+    _STATIC_EXTS = ('js', 'css', 'png', 'jpg', 'jpeg', 'gif', 'ico', 'svg',
+                    'woff', 'woff2', 'ttf', 'eot', 'pdf', 'zip', 'mp4', 'mp3',
+                    'webp', 'avif')
+    STATIC_FILE_EXTENSIONS = frozenset('.' + ext for ext in _STATIC_EXTS)
+    
+    # 非 API 请求的 URL 前缀
+    NON_API_URL_PREFIXES = ('data:image/', 'data:text/', 'chrome-extension://', 'moz-extension://')
     
-    # 非 API 请求的 URL 模式
-    NON_API_PATTERNS = [
-        r'\.(js|css|png|jpg|jpeg|gif|ico|svg|woff|woff2|ttf|eot|pdf|zip|mp4|mp3|webp|avif)(\?|$|#)',
-        r'data:image/',
-        r'data:text/',
-        r'chrome-extension://',
-        r'moz-extension://',
-    ]
+    # 验证结果可被缓存的响应体最大长度
+    CACHEABLE_BODY_SIZE = 4096
+    
+    # URL 路径中常见的 API 标识（小写）
+    API_PATH_INDICATORS = ('/api/', '/rest/', '/graphql', '/rpc/', '/service/', '/v1/', '/v2/', '/v3/')
+    
+    # 静态资源的 MIME 类型前缀（小写）
+    STATIC_MIME_PREFIXES = ('text/css', 'text/javascript', 'application/javascript',
+                            'image/', 'font/', 'video/', 'audio/', 'application/pdf')
+    
+    # 表示成功的 code 值
+    _SUCCESS_CODES = frozenset(("SUCCESS", "00000"))
     
     @classmethod
+    @functools.lru_cache(maxsize=4096)
     def _is_api_request(cls, url: str, mime_type: str = None) -> bool:
         """
         判断是否为 API 请求
         
+        结果按 (url, mime_type) 缓存，轮询、分页等重复请求直接命中缓存
+        
         Args:
             url: 请求 URL
             mime_type: MIME 类型（可选）
@@ -44,10 +75,19 @@ class ResponseValidator:
         Returns:
             是否为 API 请求
         """
-        # 检查 URL 是否匹配非 API 模式
-        for pattern in cls.NON_API_PATTERNS:
-            if re.search(pattern, url, re.IGNORECASE):
-                return False
+        # 检查 URL 是否匹配非 API 前缀
+        if url.startswith(cls.NON_API_URL_PREFIXES):
+            return False
+        
+        # 检查路径（去除查询参数和锚点）是否以静态资源扩展名结尾
+        path_end = len(url)
+        for separator in '?#':
+            index = url.find(separator, 0, path_end)
+            if index != -1:
+                path_end = index
+        dot = url.rfind('.', 0, path_end)
+        if dot != -1 and url[dot:path_end].lower() in cls.STATIC_FILE_EXTENSIONS:
+            return False
         
         # 检查 MIME 类型
         if mime_type:
@@ -56,15 +96,15 @@ class ResponseValidator:
             if 'json' in mime_lower:
                 return True
             # 如果是静态资源类型，不是 API
-            if any(ext in mime_lower for ext in ['text/css', 'text/javascript', 'application/javascript',
-                                                  'image/', 'font/', 'video/', 'audio/', 'application/pdf']):
+            if mime_lower.startswith(cls.STATIC_MIME_PREFIXES):
                 return False
         
         # 检查 URL 路径是否包含常见的 API 路径标识
+        # 逐个做子串查找并在命中时立即返回，比 any() 生成器表达式和正则交替匹配都快
         url_lower = url.lower()
-        api_indicators = ['/api/', '/rest/', '/graphql', '/rpc/', '/service/', '/v1/', '/v2/', '/v3/']
-        if any(indicator in url_lower for indicator in api_indicators):
-            return True
+        for indicator in cls.API_PATH_INDICATORS:
+            if indicator in url_lower:
+                return True
         
         # 如果 URL 是根路径或 HTML 页面，不是 API
         if url_lower.endswith('/') or url_lower.endswith('.html') or url_lower.endswith('.htm'):
@@ -75,22 +115,20 @@ class ResponseValidator:
         return True
     
     @classmethod
-    def _is_json_like(cls, response_body: str) -> bool:
+    def is_api_request(cls, url: str, mime_type: str = None) -> bool:
         """
-        判断响应体是否看起来像 JSON
+        仅根据 URL 和 MIME 类型快速判断是否为 API 请求，不需要响应体
+        
+        调用方可在获取响应体之前先用它过滤掉静态资源等非 API 请求
         
         Args:
-            response_body: 响应体内容
+            url: 请求 URL
+            mime_type: MIME 类型（可选）
         
         Returns:
-            是否像 JSON
+            是否为 API 请求
         """
-        if not response_body:
-            return False
-        
-        stripped = response_body.strip()
-        # JSON 通常以 { 或 [ 开头
-        return stripped.startswith('{') or stripped.startswith('[')
+        return cls._is_api_request(url, mime_type)
     
     @staticmethod
     def validate_response(status_code: int, response_body: str, url: str, 
@@ -109,13 +147,13 @@ class ResponseValidator:
             如果不是 API 请求，返回 (True, None, "", False) 表示跳过验证
         """
         # 首先判断是否为 API 请求
-        is_api = ResponseValidator._is_api_request(url, mime_type)
+        is_api = _is_api_request(url, mime_type)
         
         # 如果不是 API 请求，跳过验证
         if not is_api:
             return True, None, "", False
         
-        # 检查状态码
+        # 检查状态码，状态码错误与响应体无关，直接返回
         if not (200 <= status_code < 300):
             error_msg = f"HTTP {status_code}"
             if status_code == 404:
@@ -135,26 +173,58 @@ class ResponseValidator:
             # 对于 API 请求，空响应体可能是错误
             return False, ErrorType.FORMAT_ERROR, "响应体为空", True
         
+        # 较短的响应体（重复出现的错误响应通常很短）直接复用之前的验证结果
+        if len(response_body) <= _CACHEABLE_BODY_SIZE:
+            return _validate_body_cached(response_body, mime_type)
+        return _validate_body(response_body, mime_type)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _validate_body_cached(response_body: str,
+                              mime_type: str = None) -> Tuple[bool, Optional[ErrorType], str, bool]:
+        """带缓存的 _validate_body，只应用于较短的响应体以限制缓存占用的内存"""
+        return ResponseValidator._validate_body(response_body, mime_type)
+    
+    @staticmethod
+    def _validate_body(response_body: str,
+                       mime_type: str = None) -> Tuple[bool, Optional[ErrorType], str, bool]:
+        """
+        验证状态码正常的 API 响应的响应体
+        
+        Args:
+            response_body: 响应体内容（非空）
+            mime_type: MIME 类型（可选）
+        
+        Returns:
+            (是否成功, 错误类型, 错误消息, 是否为 API 请求)
+        """
         # 如果响应体看起来不像 JSON，但 MIME 类型是 JSON，仍然尝试解析
         # 如果响应体看起来不像 JSON 且 MIME 类型也不是 JSON，可能不是 API 响应
-        if not ResponseValidator._is_json_like(response_body):
+        # 找到第一个非空白字符，JSON 通常以 { 或 [ 开头（不使用 strip()，避免复制整个响应体）
+        start = 0
+        body_length = len(response_body)
+        while start < body_length and response_body[start].isspace():
+            start += 1
+        if start == body_length or response_body[start] not in ('{', '['):
             if mime_type and 'json' not in mime_type.lower():
                 # 看起来不像 JSON 且 MIME 类型也不是 JSON，跳过
                 return True, None, "", False
         
         try:
             # 尝试解析 JSON，使用更宽松的解析方式
-            # 先尝试标准解析
+            # 先去除开头的空白和可能的 BOM，只解析一次（结尾的空白 JSON 解析器本身允许）
+            cleaned_body = response_body[start:] if start else response_body
+            if cleaned_body.startswith('\ufeff'):
+                cleaned_body = cleaned_body[1:]
             try:
-                response_data = json.loads(response_body)
+                response_data = _json_loads(cleaned_body)
             except json.JSONDecodeError:
-                # 如果标准解析失败，尝试清理可能的 BOM 或前后空白
-                cleaned_body = response_body.strip()
-                # 移除可能的 BOM
-                if cleaned_body.startswith('\ufeff'):
-                    cleaned_body = cleaned_body[1:]
-                # 再次尝试解析
-                response_data = json.loads(cleaned_body)
+                # 结尾含有 JSON 不允许的空白字符（如 \u3000、\xa0）时去除后再解析，
+                # 与去除首尾空白后解析的结果保持一致；只在解析失败时才复制响应体
+                stripped_body = cleaned_body.rstrip()
+                if len(stripped_body) == len(cleaned_body):
+                    raise
+                response_data = _json_loads(stripped_body)
             
             # 检查是否为字典类型
             if not isinstance(response_data, dict):
@@ -178,9 +248,8 @@ class ResponseValidator:
             
             # 检查 code 是否为成功状态（SUCCESS 或 00000）
             code_value = response_data.get('code')
-            # 支持两种成功状态：SUCCESS 和 00000
-            success_codes = ["SUCCESS", "00000"]
-            if code_value not in success_codes:
+            # 支持两种成功状态：SUCCESS 和 00000（code 可能是不可哈希的对象，先判断类型）
+            if not isinstance(code_value, str) or code_value not in ResponseValidator._SUCCESS_CODES:
                 error_msg = f"code={code_value}"
                 # 提取错误消息
                 if 'message' in response_data:
@@ -198,11 +267,11 @@ class ResponseValidator:
             # 提供更详细的 JSON 解析错误信息
             error_detail = str(e)
             if "Expecting value" in error_detail:
-                # 可能是空响应或非 JSON 内容
-                if not response_body.strip():
+                # 可能是空响应或非 JSON 内容（复用前面找到的第一个非空白字符位置，不调用 strip()）
+                if start == body_length:
                     return False, ErrorType.FORMAT_ERROR, "响应体为空或只包含空白字符", True
                 # 检查是否可能是 HTML
-                if response_body.strip().startswith('<'):
+                if response_body[start] == '<':
                     return True, None, "", False  # 可能是 HTML 页面，跳过
                 return False, ErrorType.FORMAT_ERROR, f"JSON 解析失败: 响应不是有效的 JSON 格式", True
             else:
@@ -210,3 +279,10 @@ class ResponseValidator:
         except Exception as e:
             return False, ErrorType.FORMAT_ERROR, f"验证过程出错: {str(e)}", True
 
+
+# validate_response 热路径上使用的模块级别名
+# 直接按全局名调用，省去每次调用时的类属性查找和 classmethod 绑定
+_is_api_request = ResponseValidator._is_api_request
+_validate_body_cached = ResponseValidator._validate_body_cached
+_validate_body = ResponseValidator._validate_body
+_CACHEABLE_BODY_SIZE = ResponseValidator.CACHEABLE_BODY_SIZE
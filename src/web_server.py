@@ -4,9 +4,37 @@ Web 服务器模块
 """
 import os
 import json
-from flask import Flask, render_template, jsonify
-from typing import Optional
-from .error_summarizer import ErrorSummarizer
+from flask import Flask, Response, render_template, jsonify
+from typing import Dict, Optional, Tuple
+from .error_summarizer import ErrorSummarizer, ErrorRecord
+
+
+def _json_dumps(data) -> bytes:
+    """使用标准库序列化，字符串中含有单独的代理项（无法编码为 UTF-8）时转义为 \\uXXXX"""
+    try:
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+    except UnicodeEncodeError:
+        return json.dumps(data).encode('ascii')
+
+
+try:
+    # orjson 为可选依赖，序列化比标准库快数倍
+    import orjson
+    
+    def _dumps(data) -> bytes:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            # orjson 不接受单独的代理项，交给标准库处理
+            return _json_dumps(data)
+except ImportError:
+    _dumps = _json_dumps
+
+try:
+    # waitress 为可选依赖，安装后使用它代替 Flask 自带的开发服务器
+    from waitress import serve
+except ImportError:
+    serve = None
 
 
 class WebServer:
@@ -31,6 +59,12 @@ class WebServer:
         self.host = host
         self.port = port
         
+        # (错误数据版本号, 统计摘要的序列化结果)，版本号不变时直接复用，整体替换保证两者一致
+        self._summary_cache: Tuple[int, Optional[bytes]] = (-1, None)
+        # (错误数据版本号, URI -> 错误记录的索引, 查询 URI -> 匹配结果的缓存)
+        # 三者作为一个元组整体替换，查询时不会把索引与其他版本的匹配结果混用
+        self._uri_state: Tuple[int, Dict[str, ErrorRecord], Dict[str, Optional[ErrorRecord]]] = (-1, {}, {})
+        
         # 注册路由
         self._register_routes()
     
@@ -46,10 +80,17 @@ class WebServer:
         def get_summary():
             """获取统计摘要 API"""
             try:
+                # 先读取版本号再构建数据，构建期间有新错误时下次请求会重新构建
+                version = self.error_summarizer.version
+                cached_version, cached_body = self._summary_cache
+                if version == cached_version:
+                    return Response(cached_body, mimetype='application/json')
+                
                 errors = self.error_summarizer.get_summary()
                 
-                # 转换为字典格式
+                # 转换为字典格式，同时累计错误请求次数，只遍历一次记录
                 errors_data = []
+                total_requests = 0
                 for record in errors:
                     errors_data.append({
                         'uri': record.uri,
@@ -58,15 +99,15 @@ class WebServer:
                         'status_code': record.status_code,
                         'count': record.count
                     })
+                    total_requests += record.count
                 
                 # 获取统计信息
                 total_errors = len(errors)
-                total_requests = sum(record.count for record in errors)
                 
-                # 调试输出
-                print(f"API 请求: 返回 {total_errors} 个错误，共 {total_requests} 次错误请求")
+                # 调试输出（默认日志级别下不输出）
+                self.app.logger.debug("API 请求: 返回 %d 个错误，共 %d 次错误请求", total_errors, total_requests)
                 
-                return jsonify({
+                body = _dumps({
                     'success': True,
                     'data': {
                         'total_errors': total_errors,
@@ -76,9 +117,10 @@ class WebServer:
                         'output_file': os.path.basename(self.error_summarizer.output_file) if self.error_summarizer.output_file else None
                     }
                 })
+                self._summary_cache = (version, body)
+                return Response(body, mimetype='application/json')
             except Exception as e:
-                import traceback
-                traceback.print_exc()
+                self.app.logger.debug("获取统计摘要失败", exc_info=True)
                 return jsonify({
                     'success': False,
                     'error': str(e)
@@ -92,49 +134,36 @@ class WebServer:
                 # 解码 URI（Flask 会自动解码，但为了安全再次处理）
                 decoded_uri = unquote(uri)
                 
-                errors = self.error_summarizer.get_summary()
-                
-                # 标准化 URI：提取路径部分（去除查询参数和域名）
-                normalized_uri = self.error_summarizer._extract_uri_path(decoded_uri)
+                record = self._find_record(decoded_uri)
                 
-                # 调试输出
-                print(f"查找错误详情 - 原始 URI: {decoded_uri}, 标准化 URI: {normalized_uri}")
-                print(f"可用 URI 列表: {[r.uri for r in errors]}")
-                
-                # 查找匹配的错误记录（尝试多种匹配方式）
-                for record in errors:
-                    # 尝试多种匹配方式：精确匹配、标准化路径匹配、包含匹配
-                    if (record.uri == decoded_uri or 
-                        record.uri == normalized_uri or
-                        (normalized_uri and record.uri.endswith(normalized_uri)) or
-                        (record.uri and normalized_uri.endswith(record.uri))):
-                        
-                        # 转换详情为字典格式
-                        details_data = []
-                        for detail in record.details:
-                            details_data.append({
-                                'error_message': detail.error_message,
-                                'status_code': detail.status_code,
-                                'request_method': detail.request_method,
-                                'request_headers': detail.request_headers,
-                                'request_body': detail.request_body,
-                                'response_headers': detail.response_headers,
-                                'response_body': detail.response_body,
-                                'timestamp': detail.timestamp.strftime('%Y-%m-%d %H:%M:%S') if detail.timestamp else None
-                            })
-                        
-                        return jsonify({
-                            'success': True,
-                            'data': {
-                                'uri': record.uri,
-                                'error_type': record.error_type.value,
-                                'count': record.count,
-                                'details': details_data
-                            }
+                if record is not None:
+                    # 转换详情为字典格式
+                    details_data = []
+                    for detail in record.details:
+                        details_data.append({
+                            'error_message': detail.error_message,
+                            'status_code': detail.status_code,
+                            'request_method': detail.request_method,
+                            'request_headers': dict(detail.request_headers),
+                            'request_body': detail.request_body,
+                            'response_headers': dict(detail.response_headers),
+                            'response_body': detail.response_body,
+                            'count': detail.count,
+                            'timestamp': detail.timestamp.strftime('%Y-%m-%d %H:%M:%S') if detail.timestamp else None
                         })
+                    
+                    return Response(_dumps({
+                        'success': True,
+                        'data': {
+                            'uri': record.uri,
+                            'error_type': record.error_type.value,
+                            'count': record.count,
+                            'details': details_data
+                        }
+                    }), mimetype='application/json')
                 
                 # 如果都没匹配到，返回详细错误信息
-                available_uris = [r.uri for r in errors]
+                available_uris = list(self._get_uri_index()[0])
                 return jsonify({
                     'success': False,
                     'error': f'未找到指定的错误记录。查找的 URI: {decoded_uri}，可用 URI: {available_uris}'
@@ -145,16 +174,69 @@ class WebServer:
                     'error': str(e)
                 }), 500
     
-    def run(self, debug: bool = False):
+    def _get_uri_index(self) -> Tuple[Dict[str, ErrorRecord], Dict[str, Optional[ErrorRecord]]]:
+        """
+        获取 URI 到错误记录的索引及对应的查询缓存，错误数据有变化时一起重建
+        
+        Returns:
+            (以记录 URI 为键的字典, 查询 URI 到匹配结果的缓存)
+        """
+        version = self.error_summarizer.version
+        state = self._uri_state
+        if state[0] != version:
+            # 记录的 URI 在写入时已经标准化，直接作为键即可
+            state = (version, {record.uri: record for record in self.error_summarizer.get_summary()}, {})
+            self._uri_state = state
+        return state[1], state[2]
+    
+    def _find_record(self, uri: str) -> Optional[ErrorRecord]:
+        """
+        查找与 URI 匹配的错误记录，依次尝试精确匹配、标准化路径匹配和后缀匹配
+        
+        Args:
+            uri: 解码后的 URI
+        
+        Returns:
+            匹配的错误记录，未找到时返回 None
+        """
+        uri_index, uri_lookup = self._get_uri_index()
+        if uri in uri_lookup:
+            return uri_lookup[uri]
+        
+        # 标准化 URI：提取路径部分（去除查询参数和域名）
+        normalized_uri = self.error_summarizer._extract_uri_path(uri)
+        
+        # 调试输出（默认日志级别下不输出）
+        self.app.logger.debug("查找错误详情 - 原始 URI: %s, 标准化 URI: %s", uri, normalized_uri)
+        
+        # 先按精确匹配、标准化路径匹配查索引，都未命中时再按后缀匹配
+        record = uri_index.get(uri) or uri_index.get(normalized_uri)
+        if record is None and normalized_uri:
+            record = next(
+                (r for r in uri_index.values()
+                 if r.uri.endswith(normalized_uri) or (r.uri and normalized_uri.endswith(r.uri))),
+                None
+            )
+        
+        if len(uri_lookup) >= self.error_summarizer.PATH_CACHE_SIZE:
+            uri_lookup.clear()
+        uri_lookup[uri] = record
+        return record
+    
+    def run(self, debug: bool = False, dev: bool = False):
         """
         启动 Web 服务器
         
         Args:
             debug: 是否启用调试模式
+            dev: 是否强制使用 Flask 开发服务器（未安装 waitress 时总是使用）
         """
         try:
             print(f"\nWeb 服务正在启动: http://{self.host}:{self.port}")
             print(f"在浏览器中访问 http://{self.host}:{self.port} 查看统计结果\n")
+            if serve is not None and not dev:
+                serve(self.app, host=self.host, port=self.port, threads=8)
+                return
             # 在后台线程中运行 Flask，需要禁用 reloader
             self.app.run(
                 host=self.host, 